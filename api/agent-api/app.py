@@ -1,66 +1,139 @@
 import os
-from pathlib import Path
+from functools import partial
+from typing import Tuple
 
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-from jsonschema import Draft7Validator
-from jsonschema.exceptions import ValidationError
-from tictactoe.agent import QLearningAgent
-from tictactoe.schema import state_schema
-from tictactoe.states import Board
-from training import LearningAgentWrapper
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-app = Flask(__name__)
-CORS(app)
+ACTION_CACHE_SIZE = 10000
 
-# Configuration required to use Flask behind a proxy.
-app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
 
-game_state_validator = Draft7Validator(
-    schema={
-        "type": "object",
-        "properties": {
-            "state": state_schema,
-            "agent_is_x": {"type": "boolean"},
-        },
-        "required": ["state"],
-        "additional_properties": False,
-    }
-)
+def create_app() -> Flask:
+    """Create the Agent API application.
 
-agent_wrapper = LearningAgentWrapper()
+    Heavy dependencies (jsonschema, numpy and psycopg2) are only imported here, and
+    the training thread and database connection are only created here. Pre-fork
+    servers should call this from each worker, e.g. `gunicorn "app:create_app()"`.
+    """
+    from cache import VersionedLRUCache
+    from jsonschema import Draft7Validator
+    from jsonschema.exceptions import ValidationError
+    from tictactoe.agent import GREEDY_SELECTION, ActionDistribution, QLearningAgent
+    from tictactoe.schema import state_schema
+    from tictactoe.states import Board
+    from training import LearningAgentWrapper
 
+    app = Flask(__name__)
+    CORS(app)
 
-def get_agent_action(game_state) -> Board:
-    game_board = Board.from_text_board(
-        game_state["state"], agent_is_x=game_state["agent_is_x"]
-    )
-    with agent_wrapper.agent_read_lock:
-        action = agent_wrapper.agent.act(game_board)
-
-    if not game_state["agent_is_x"]:
-        # Swap back the symbols of the action if the agent is
-        # not X.
-        # TODO(richie): This should be refactored so it's not
-        # a concern of the API.
-        action = action.swap_symbols()
-
-    return action
-
-
-@app.post("/action")
-def take_action():
-    game_state = request.get_json()
-    try:
-        game_state_validator.validate(game_state)
-    except ValidationError as e:
-        return jsonify({"message": str(e)}), 400
-
-    action = get_agent_action(game_state)
-    return jsonify(
-        {
-            "message": "success",
-            "action": list(action.text_board.flatten()),
+    # Configuration required to use Flask behind a proxy.
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
+
+    game_state_validator = Draft7Validator(
+        schema={
+            "type": "object",
+            "properties": {
+                "state": state_schema,
+                "agent_is_x": {"type": "boolean"},
+            },
+            "required": ["state"],
+            "additional_properties": False,
         }
     )
+
+    agent_wrapper = LearningAgentWrapper()
+    agent_wrapper.start()
+
+    action_cache_size = int(os.environ.get("ACTION_CACHE_SIZE", ACTION_CACHE_SIZE))
+    # Maps normalized state codes to the agent's action distribution.
+    distribution_cache = VersionedLRUCache(max_size=action_cache_size)
+    # Maps incoming game states to serialized responses. Responses are only
+    # deterministic, and so only cached, when the agent uses greedy selection.
+    response_cache = VersionedLRUCache(max_size=action_cache_size)
+    # When set, deterministic responses are marked as cacheable by HTTP caches (e.g.
+    # nginx) for this many seconds, at the cost of serving them for that long after
+    # the agent is retrained.
+    http_cache_max_age_secs = os.environ.get("ACTION_HTTP_CACHE_MAX_AGE_SECS")
+    if http_cache_max_age_secs is not None:
+        http_cache_max_age_secs = int(http_cache_max_age_secs)
+
+    def cached_action_distribution(
+        model_version: int, state_code: int
+    ) -> ActionDistribution:
+        # State codes are normalized, so all symmetrical game states share the same
+        # cached action distribution.
+        action_distribution = distribution_cache.get(model_version, state_code)
+        if action_distribution is None:
+            action_distribution = agent_wrapper.agent.action_distribution(state_code)
+            distribution_cache.put(model_version, state_code, action_distribution)
+        return action_distribution
+
+    def get_agent_action(game_state) -> Tuple[Board, int]:
+        """Return the agent's action and the version of the model that chose it."""
+        game_board = Board.from_text_board(
+            game_state["state"], agent_is_x=game_state["agent_is_x"]
+        )
+        with agent_wrapper.agent_read_lock:
+            # The model version is read under the lock, so it always matches the
+            # agent that chooses the action.
+            model_version = agent_wrapper.model_version
+            action = QLearningAgent.choose_action(
+                game_board, partial(cached_action_distribution, model_version)
+            )
+
+        if not game_state["agent_is_x"]:
+            # Swap back the symbols of the action if the agent is
+            # not X.
+            # TODO(richie): This should be refactored so it's not
+            # a concern of the API.
+            action = action.swap_symbols()
+
+        return action, model_version
+
+    @app.post("/action")
+    def take_action():
+        game_state = request.get_json()
+        try:
+            game_state_validator.validate(game_state)
+        except ValidationError as e:
+            return jsonify({"message": str(e)}), 400
+
+        response_key = (tuple(game_state["state"]), game_state["agent_is_x"])
+        response_body = None
+        if GREEDY_SELECTION:
+            # A cached response is only found under the model version that computed
+            # it, so it is served with that version even if the agent was retrained
+            # in the meantime.
+            model_version = agent_wrapper.model_version
+            response_body = response_cache.get(model_version, response_key)
+
+        if response_body is None:
+            action, model_version = get_agent_action(game_state)
+            response_body = jsonify(
+                {
+                    "message": "success",
+                    "action": list(action.text_board.flatten()),
+                }
+            ).get_data()
+            if GREEDY_SELECTION:
+                response_cache.put(model_version, response_key, response_body)
+
+        response = app.response_class(response_body, mimetype="application/json")
+        response.headers["X-Model-Version"] = str(model_version)
+        if GREEDY_SELECTION and http_cache_max_age_secs is not None:
+            response.cache_control.public = True
+            response.cache_control.max_age = http_cache_max_age_secs
+        return response
+
+    @app.get("/metrics")
+    def metrics():
+        return jsonify(
+            {
+                "model_version": agent_wrapper.model_version,
+                "distribution_cache": distribution_cache.stats,
+                "response_cache": response_cache.stats,
+            }
+        )
+
+    return app
@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class VersionedLRUCache:
+    """A thread-safe, size bounded LRU cache whose entries are only valid for a
+    single model version.
+
+    Every lookup is made with the current model version, and the cache is cleared as
+    soon as it sees a newer one, so entries computed by an older agent are never
+    served. Model versions must increase monotonically.
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._model_version = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _check_version(self, model_version: int) -> bool:
+        """Return whether `model_version` is current, clearing the cache if it is new."""
+        if self._model_version is None or model_version > self._model_version:
+            self._entries.clear()
+            self._model_version = model_version
+
+        # A request may still be using the previous agent just after it was swapped.
+        return model_version == self._model_version
+
+    def get(self, model_version: int, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = None
+            if self._check_version(model_version):
+                value = self._entries.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, model_version: int, key: Hashable, value: Any):
+        with self._lock:
+            if not self._check_version(model_version):
+                return
+
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self._max_size:
+                # Evict the least recently used entry.
+                self._entries.popitem(last=False)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._entries),
+                "max_size": self._max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups > 0 else 0.0,
+            }
@@ -0,0 +1,267 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+import psycopg2
+from psycopg2.errors import QueryCanceled
+from psycopg2.extensions import TransactionRollbackError
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 4
+STATEMENT_TIMEOUT_MS = 30000
+CONNECT_TIMEOUT_SECS = 5
+RECONNECT_ATTEMPTS = 5
+RECONNECT_BACKOFF_SECS = 0.5
+RECONNECT_BACKOFF_MAX_SECS = 8.0
+QUERY_ATTEMPTS = 2
+
+PLAYDATA_RETENTION_DAYS = 90
+# The number of future monthly partitions that are created ahead of time.
+PLAYDATA_PARTITIONS_AHEAD = 2
+# Compacting a whole partition can take far longer than a regular query.
+COMPACTION_STATEMENT_TIMEOUT_MS = 600000
+# The advisory lock key that serializes partition maintenance across all workers. It
+# must match the key used by the functions in postgres.sql.
+PLAYDATA_MAINTENANCE_LOCK = "playdata_maintenance"
+# Databases created before playdata was partitioned must be migrated before compaction
+# can run.
+PLAYDATA_MIGRATED_QUERY = "SELECT to_regclass('playdata_transitions') IS NOT NULL"
+PLAYDATA_MIGRATION_HINT = "run migrations/0001_partition_playdata.sql"
+
+T = TypeVar("T")
+
+
+class PostgresPool:
+    """A thread-safe pool of Postgres connections shared by all playdata queries.
+
+    Connections are health checked before use and broken connections are replaced,
+    retrying with exponential backoff, so queries survive a database restart or
+    failover. Every connection has a statement timeout so a slow query cannot block
+    its caller indefinitely.
+    """
+
+    def __init__(
+        self,
+        conn_str: str,
+        min_connections: int = POOL_MIN_CONNECTIONS,
+        max_connections: int = POOL_MAX_CONNECTIONS,
+        statement_timeout_ms: int = STATEMENT_TIMEOUT_MS,
+        reconnect_attempts: int = RECONNECT_ATTEMPTS,
+    ):
+        if conn_str is None:
+            raise EnvironmentError("Must define a Postgres connection string")
+
+        self._conn_str = conn_str
+        self._min_connections = min_connections
+        self._max_connections = max_connections
+        self._statement_timeout_ms = statement_timeout_ms
+        self._reconnect_attempts = reconnect_attempts
+
+        # The pool is created on first use so that constructing it never blocks on,
+        # or fails because of, an unavailable database.
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(
+                    self._min_connections,
+                    self._max_connections,
+                    dsn=self._conn_str,
+                    connect_timeout=CONNECT_TIMEOUT_SECS,
+                    options=f"-c statement_timeout={self._statement_timeout_ms}",
+                )
+            return self._pool
+
+    @contextmanager
+    def connection(self) -> Iterator:
+        """Check out a healthy connection, reconnecting with backoff if necessary.
+
+        Raises ConnectionError if no healthy connection could be made.
+        """
+        backoff_secs = RECONNECT_BACKOFF_SECS
+        for attempt in range(self._reconnect_attempts):
+            try:
+                pool = self._get_pool()
+                conn = self._getconn(pool)
+                break
+            except (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError) as e:
+                # PoolError is raised when every connection is checked out, in which
+                # case waiting gives another caller the chance to return one.
+                error = e
+
+            if attempt < self._reconnect_attempts - 1:
+                print(f"Postgres connection unavailable, retrying in {backoff_secs}s")
+                time.sleep(backoff_secs)
+                backoff_secs = min(2 * backoff_secs, RECONNECT_BACKOFF_MAX_SECS)
+        else:
+            raise ConnectionError("could not connect to Postgres") from error
+
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except (QueryCanceled, TransactionRollbackError):
+            # The server cancelled or rolled back the statement (e.g. a statement
+            # timeout or deadlock), but the connection itself is still healthy.
+            conn.rollback()
+            raise
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # The connection may be broken, so it is closed rather than reused.
+            discard = True
+            raise
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            if pool.closed:
+                # The pool was closed while this connection was checked out.
+                conn.close()
+            else:
+                pool.putconn(conn, close=discard or bool(conn.closed))
+
+    def _getconn(self, pool):
+        """Check out a connection from `pool` that passes a health check.
+
+        After the server restarts or fails over, every idle connection in the pool is
+        stale, so up to one more than the maximum number of connections are checked
+        before giving up.
+        """
+        for _ in range(self._max_connections + 1):
+            conn = pool.getconn()
+            try:
+                self._check_health(conn)
+                return conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                # Only this connection is closed, since other threads may be using
+                # the rest of the pool.
+                error = e
+                pool.putconn(conn, close=True)
+
+        raise error
+
+    @staticmethod
+    def _check_health(conn):
+        if conn.closed:
+            raise psycopg2.InterfaceError("connection already closed")
+
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+
+    def ping(self) -> bool:
+        """Return whether a healthy connection to Postgres can be made."""
+        try:
+            with self.connection():
+                return True
+        except ConnectionError:
+            return False
+
+    def fetchall(self, query: str, params: Optional[Sequence] = None) -> List[Tuple]:
+        """Run a read-only query and return all of its rows.
+
+        Retries and errors are the same as for `read`.
+        """
+
+        def fetch(cur) -> List[Tuple]:
+            cur.execute(query, params)
+            return cur.fetchall()
+
+        return self.read(fetch)
+
+    def read(self, reader: Callable[[Any], T], repeatable_read: bool = False) -> T:
+        """Call `reader` with a cursor in a single transaction and return its result.
+
+        With `repeatable_read`, every query made by `reader` sees the same snapshot of
+        the database. `reader` must only read, since it is called again if the
+        connection is lost or the transaction is rolled back (e.g. by a deadlock)
+        while it runs. Raises ConnectionError if the retry fails too, and TimeoutError
+        if a query exceeds the statement timeout.
+        """
+        for attempt in range(QUERY_ATTEMPTS):
+            try:
+                with self.connection() as conn, conn.cursor() as cur:
+                    if repeatable_read:
+                        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                    return reader(cur)
+            except QueryCanceled as e:
+                # Statement timeouts are not retried, since the query would most
+                # likely time out again.
+                raise TimeoutError("Postgres statement timeout exceeded") from e
+            except TransactionRollbackError as e:
+                if attempt == QUERY_ATTEMPTS - 1:
+                    raise ConnectionError("Postgres rolled back the transaction") from e
+                print("Postgres rolled back the transaction, retrying query")
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if attempt == QUERY_ATTEMPTS - 1:
+                    raise ConnectionError("lost connection to Postgres") from e
+                print("Lost Postgres connection, retrying query")
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+
+def compact_playdata(
+    pool: PostgresPool, retention_days: int = PLAYDATA_RETENTION_DAYS
+) -> bool:
+    """Create upcoming playdata partitions and compact playdata older than the
+    retention period into aggregated transitions.
+
+    Returns False without doing anything if another worker is already compacting.
+
+    Raises TimeoutError if compaction exceeds its statement timeout, ConnectionError
+    if the connection is lost or the transaction is rolled back, and RuntimeError for
+    any other database error.
+    """
+    try:
+        with pool.connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "SET LOCAL statement_timeout = %s", (COMPACTION_STATEMENT_TIMEOUT_MS,)
+            )
+            cur.execute(
+                "SELECT pg_try_advisory_xact_lock(hashtext(%s))",
+                (PLAYDATA_MAINTENANCE_LOCK,),
+            )
+            if not cur.fetchone()[0]:
+                return False
+
+            cur.execute(PLAYDATA_MIGRATED_QUERY)
+            if not cur.fetchone()[0]:
+                raise RuntimeError(
+                    f"playdata schema is not partitioned, {PLAYDATA_MIGRATION_HINT}"
+                )
+
+            month = date.today().replace(day=1)
+            for _ in range(PLAYDATA_PARTITIONS_AHEAD + 1):
+                cur.execute("SELECT create_playdata_partition(%s)", (month,))
+                month = (month + timedelta(days=31)).replace(day=1)
+
+            cur.execute(
+                "SELECT compact_playdata(now() - %s * INTERVAL '1 day')",
+                (retention_days,),
+            )
+        return True
+    except QueryCanceled as e:
+        raise TimeoutError("playdata compaction exceeded its statement timeout") from e
+    except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+        raise ConnectionError("playdata compaction was interrupted") from e
+    except psycopg2.Error as e:
+        raise RuntimeError(f"playdata compaction failed: {e}") from e
+
+
+if __name__ == "__main__":
+    compacted = compact_playdata(
+        PostgresPool(os.environ.get("POSTGRES_CONNECTION")),
+        retention_days=int(
+            os.environ.get("PLAYDATA_RETENTION_DAYS", PLAYDATA_RETENTION_DAYS)
+        ),
+    )
+    print("Compaction completed" if compacted else "Compaction already in progress")
@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+from playdatadb import PLAYDATA_MIGRATED_QUERY, PostgresPool
+
+SNAPSHOT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+# Each column of playdata is stored as its own `.npy` file so that it can be memory
+# mapped. Board codes are at most 222222222, so they fit in 32 bits. Rewards need 64
+# bits, since compacted transitions hold a mean reward computed in double precision.
+COLUMN_DTYPES = {
+    "initial_state": np.int32,
+    "action": np.int32,
+    "resultant_state": np.int32,
+    "reward": np.float64,
+}
+EXPORT_CHUNK_SIZE = 100000
+# Rows are converted to Python tuples this many at a time while iterating.
+ITERATION_CHUNK_SIZE = 65536
+
+
+def export_snapshot(pool: PostgresPool, path: Path) -> Dict:
+    """Export all playdata to a snapshot directory at `path` and return its manifest.
+
+    Rows are stored in the order they are replayed by training, so a snapshot loaded
+    with `FilePlaydata` trains the same agent as `PostgresPlaydata`.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    # The manifest is written last, so a partially written snapshot cannot be loaded.
+    (path / MANIFEST_FILE).unlink(missing_ok=True)
+
+    chunks = {column: [] for column in COLUMN_DTYPES}
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            # Read both tables from a single consistent snapshot of the database, so
+            # that compaction cannot move rows between them mid-export.
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cur.execute("SELECT MIN(id), MAX(id), COUNT(*) FROM playdata")
+            min_id, max_id, raw_count = cur.fetchone()
+
+        # A server side cursor streams rows rather than loading them all at once.
+        with conn.cursor(name="playdata_snapshot") as cur:
+            cur.execute(
+                "SELECT initial_state, action, resultant_state, reward FROM playdata "
+                "ORDER BY id DESC"
+            )
+            _append_chunks(cur, chunks)
+
+        with conn.cursor() as cur:
+            cur.execute(PLAYDATA_MIGRATED_QUERY)
+            (migrated,) = cur.fetchone()
+
+        compacted_count = 0
+        # Databases created before playdata was partitioned have no compacted
+        # transitions.
+        if migrated:
+            with conn.cursor(name="playdata_transitions_snapshot") as cur:
+                cur.execute(
+                    "SELECT initial_state, action, resultant_state, "
+                    "reward_sum / transition_count "
+                    "FROM playdata_transitions ORDER BY last_id DESC"
+                )
+                compacted_count = _append_chunks(cur, chunks)
+
+    for column, dtype in COLUMN_DTYPES.items():
+        np.save(path / f"{column}.npy", np.concatenate(chunks[column]).astype(dtype))
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        "min_id": min_id,
+        "max_id": max_id,
+        "raw_count": raw_count,
+        "compacted_count": compacted_count,
+    }
+    with (path / MANIFEST_FILE).open("w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    return manifest
+
+
+def _append_chunks(cur, chunks: Dict[str, List[np.ndarray]]) -> int:
+    row_count = 0
+    # Start each column with an empty chunk so that empty tables concatenate.
+    for column, dtype in COLUMN_DTYPES.items():
+        chunks[column].append(np.empty(0, dtype=dtype))
+
+    while True:
+        rows = cur.fetchmany(EXPORT_CHUNK_SIZE)
+        if len(rows) == 0:
+            return row_count
+
+        row_count += len(rows)
+        for (column, dtype), values in zip(COLUMN_DTYPES.items(), zip(*rows)):
+            chunks[column].append(np.array(values, dtype=dtype))
+
+
+class PlaydataRows(Sequence):
+    """A read-only sequence of playdata rows backed by column arrays.
+
+    Slicing returns another PlaydataRows over views of the same arrays, and rows are
+    only converted to Python tuples as they are iterated, so memory mapped columns
+    are never read into memory all at once.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[Tuple[int, int, int, float], "PlaydataRows"]:
+        if isinstance(index, slice):
+            return PlaydataRows(
+                {column: values[index] for column, values in self.columns.items()}
+            )
+
+        return tuple(self.columns[column][index].item() for column in COLUMN_DTYPES)
+
+    def __iter__(self) -> Iterator[Tuple[int, int, int, float]]:
+        for start in range(0, len(self), ITERATION_CHUNK_SIZE):
+            end = start + ITERATION_CHUNK_SIZE
+            yield from zip(
+                *(self.columns[column][start:end].tolist() for column in COLUMN_DTYPES)
+            )
+
+    def tolist(self) -> List[Tuple[int, int, int, float]]:
+        """Return every row as a list, matching `PostgresPlaydata.get`."""
+        return list(self)
+
+
+class FilePlaydata:
+    """Playdata loaded from a snapshot written by `export_snapshot`.
+
+    This can be used in place of `PostgresPlaydata` to train or evaluate without a
+    database.
+    """
+
+    def __init__(self, path: Path):
+        path = Path(path)
+        manifest_path = path / MANIFEST_FILE
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"no snapshot manifest at {manifest_path}")
+
+        with manifest_path.open() as manifest_file:
+            self.manifest = json.load(manifest_file)
+        if self.manifest["version"] != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot version {self.manifest['version']}")
+
+        # The columns are memory mapped, so they are only read from disk as needed.
+        self.columns = {
+            column: np.load(path / f"{column}.npy", mmap_mode="r")
+            for column in COLUMN_DTYPES
+        }
+
+    def get(self) -> PlaydataRows:
+        """Return the playdata rows without reading them into memory.
+
+        The rows support `len`, slicing and repeated iteration, which is all that
+        training needs. Use `tolist` on the result where an actual list is required.
+        """
+        return PlaydataRows(self.columns)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export playdata from Postgres to a snapshot directory."
+    )
+    parser.add_argument("path", type=Path, help="The snapshot directory to write.")
+    args = parser.parse_args()
+
+    manifest = export_snapshot(
+        PostgresPool(os.environ.get("POSTGRES_CONNECTION")), args.path
+    )
+    print(
+        f"Exported {manifest['raw_count']} data points (IDs {manifest['min_id']} to "
+        f"{manifest['max_id']}) and {manifest['compacted_count']} compacted transitions"
+    )
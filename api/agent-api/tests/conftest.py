@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The Agent API's modules are imported as top level modules, as they are when the API
+# is run from its own directory.
+sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -0,0 +1,60 @@
+from cache import VersionedLRUCache
+
+
+def test_get_returns_put_value():
+    cache = VersionedLRUCache(max_size=2)
+    cache.put(0, "a", 1)
+
+    assert cache.get(0, "a") == 1
+    assert cache.get(0, "b") is None
+
+
+def test_evicts_least_recently_used_at_max_size():
+    cache = VersionedLRUCache(max_size=2)
+    cache.put(0, "a", 1)
+    cache.put(0, "b", 2)
+    # Using "a" makes "b" the least recently used entry.
+    cache.get(0, "a")
+    cache.put(0, "c", 3)
+
+    assert cache.get(0, "a") == 1
+    assert cache.get(0, "b") is None
+    assert cache.get(0, "c") == 3
+    assert cache.stats["size"] == 2
+
+
+def test_newer_version_clears_cache():
+    cache = VersionedLRUCache(max_size=2)
+    cache.put(0, "a", 1)
+
+    assert cache.get(1, "a") is None
+    assert cache.stats["size"] == 0
+
+
+def test_stale_version_is_ignored():
+    cache = VersionedLRUCache(max_size=2)
+    cache.put(1, "a", 1)
+    # A request that read the previous model version must neither be served nor
+    # overwrite entries of the current version.
+    cache.put(0, "a", 0)
+    cache.put(0, "b", 0)
+
+    assert cache.get(0, "a") is None
+    assert cache.get(1, "a") == 1
+    assert cache.get(1, "b") is None
+
+
+def test_hit_rate():
+    cache = VersionedLRUCache(max_size=2)
+    assert cache.stats["hit_rate"] == 0.0
+
+    cache.put(0, "a", 1)
+    cache.get(0, "a")
+    cache.get(0, "a")
+    cache.get(0, "a")
+    cache.get(0, "b")
+
+    stats = cache.stats
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.75
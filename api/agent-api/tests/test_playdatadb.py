@@ -0,0 +1,183 @@
+import playdatadb
+import psycopg2
+import pytest
+from playdatadb import PostgresPool
+from psycopg2.errors import DeadlockDetected, QueryCanceled
+from psycopg2.pool import PoolError
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, params=None):
+        self._conn.executed.append(query)
+        if query != "SELECT 1" and self._conn.query_errors:
+            raise self._conn.query_errors.pop(0)
+
+    def fetchall(self):
+        return [(1,)]
+
+
+class FakeConnection:
+    def __init__(self, healthy=True, query_errors=()):
+        self.closed = 0 if healthy else 1
+        self.query_errors = list(query_errors)
+        self.rollbacks = 0
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakePool:
+    """Hands out the given connections, raising any that are exceptions."""
+
+    def __init__(self, connections):
+        self.closed = False
+        self._connections = list(connections)
+        self.returned = []
+
+    def getconn(self):
+        conn = self._connections.pop(0)
+        if isinstance(conn, Exception):
+            raise conn
+        return conn
+
+    def putconn(self, conn, close=False):
+        self.returned.append((conn, close))
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(playdatadb.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def make_pool(connections, reconnect_attempts=3):
+    pool = PostgresPool("postgresql://", reconnect_attempts=reconnect_attempts)
+    fake_pool = FakePool(connections)
+    pool._get_pool = lambda: fake_pool
+    return pool, fake_pool
+
+
+def test_reconnects_with_backoff(sleeps):
+    conn = FakeConnection()
+    pool, _ = make_pool(
+        [psycopg2.OperationalError("down"), psycopg2.OperationalError("down"), conn]
+    )
+
+    with pool.connection() as checked_out:
+        assert checked_out is conn
+
+    assert sleeps == [
+        playdatadb.RECONNECT_BACKOFF_SECS,
+        2 * playdatadb.RECONNECT_BACKOFF_SECS,
+    ]
+
+
+def test_stale_connections_are_discarded_without_backoff(sleeps):
+    stale = [FakeConnection(healthy=False), FakeConnection(healthy=False)]
+    conn = FakeConnection()
+    pool, fake_pool = make_pool(stale + [conn])
+
+    with pool.connection() as checked_out:
+        assert checked_out is conn
+
+    assert sleeps == []
+    assert fake_pool.returned == [(stale[0], True), (stale[1], True), (conn, False)]
+
+
+def test_unhealthy_connections_keep_error_as_cause(sleeps):
+    checks_per_attempt = playdatadb.POOL_MAX_CONNECTIONS + 1
+    pool, fake_pool = make_pool(
+        [FakeConnection(healthy=False)] * 3 * checks_per_attempt
+    )
+
+    with pytest.raises(ConnectionError) as e:
+        with pool.connection():
+            pass
+
+    assert isinstance(e.value.__cause__, psycopg2.InterfaceError)
+    assert all(close for _, close in fake_pool.returned)
+
+
+def test_exhausted_pool_raises_connection_error(sleeps):
+    pool, _ = make_pool([PoolError("connection pool exhausted")] * 3)
+
+    with pytest.raises(ConnectionError) as e:
+        pool.fetchall("SELECT 2")
+
+    assert isinstance(e.value.__cause__, PoolError)
+
+
+def test_statement_timeout_keeps_connection(sleeps):
+    conn = FakeConnection(query_errors=[QueryCanceled("timeout")])
+    pool, fake_pool = make_pool([conn])
+
+    with pytest.raises(TimeoutError):
+        pool.fetchall("SELECT 2")
+
+    assert conn.rollbacks == 2
+    assert fake_pool.returned == [(conn, False)]
+
+
+def test_read_uses_one_repeatable_read_transaction(sleeps):
+    conn = FakeConnection()
+    pool, fake_pool = make_pool([conn])
+
+    def reader(cur):
+        cur.execute("SELECT 2")
+        cur.execute("SELECT 3")
+        return cur.fetchall()
+
+    assert pool.read(reader, repeatable_read=True) == [(1,)]
+    assert conn.executed == [
+        "SELECT 1",
+        "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ",
+        "SELECT 2",
+        "SELECT 3",
+    ]
+    assert fake_pool.returned == [(conn, False)]
+
+
+def test_deadlock_is_retried_on_the_same_connection(sleeps):
+    conn = FakeConnection(query_errors=[DeadlockDetected("deadlock")])
+    pool, fake_pool = make_pool([conn, conn])
+
+    assert pool.fetchall("SELECT 2") == [(1,)]
+    assert fake_pool.returned == [(conn, False), (conn, False)]
+
+
+def test_repeated_deadlock_raises_connection_error(sleeps):
+    conn = FakeConnection(
+        query_errors=[DeadlockDetected("deadlock"), DeadlockDetected("deadlock")]
+    )
+    pool, _ = make_pool([conn, conn])
+
+    with pytest.raises(ConnectionError, match="rolled back") as e:
+        pool.fetchall("SELECT 2")
+
+    assert isinstance(e.value.__cause__, DeadlockDetected)
+
+
+def test_lost_connection_is_discarded(sleeps):
+    broken = FakeConnection(query_errors=[psycopg2.OperationalError("lost")])
+    conn = FakeConnection()
+    pool, fake_pool = make_pool([broken, conn])
+
+    assert pool.fetchall("SELECT 2") == [(1,)]
+    assert fake_pool.returned == [(broken, True), (conn, False)]
@@ -0,0 +1,71 @@
+import json
+
+import numpy as np
+import pytest
+import snapshot
+from snapshot import COLUMN_DTYPES, MANIFEST_FILE, SNAPSHOT_VERSION, FilePlaydata
+
+ROWS = [
+    (0, 100000000, 20001, 0.0),
+    (20001, 1, 21012, 0.5),
+    (21012, 10, 221012, -1.0),
+]
+
+
+def write_snapshot(path, rows, version=SNAPSHOT_VERSION):
+    columns = zip(*rows) if rows else [[]] * len(COLUMN_DTYPES)
+    for (column, dtype), values in zip(COLUMN_DTYPES.items(), columns):
+        np.save(path / f"{column}.npy", np.array(values, dtype=dtype))
+
+    with (path / MANIFEST_FILE).open("w") as manifest_file:
+        json.dump({"version": version}, manifest_file)
+
+
+def test_len_and_indexing(tmp_path):
+    write_snapshot(tmp_path, ROWS)
+    rows = FilePlaydata(tmp_path).get()
+
+    assert len(rows) == 3
+    assert rows[0] == ROWS[0]
+    assert rows[-1] == ROWS[-1]
+    assert len(rows[1:]) == 2
+    assert rows[1:][0] == ROWS[1]
+    assert rows[::2].tolist() == ROWS[::2]
+
+
+def test_iterates_python_values_repeatedly(tmp_path, monkeypatch):
+    # A chunk size that does not divide the row count covers a partial last chunk.
+    monkeypatch.setattr(snapshot, "ITERATION_CHUNK_SIZE", 2)
+    write_snapshot(tmp_path, ROWS)
+    rows = FilePlaydata(tmp_path).get()
+
+    assert list(rows) == ROWS
+    assert list(rows) == ROWS
+    for initial_state, action, resultant_state, reward in rows:
+        assert type(initial_state) is int
+        assert type(action) is int
+        assert type(resultant_state) is int
+        assert type(reward) is float
+
+
+def test_empty_snapshot(tmp_path):
+    write_snapshot(tmp_path, [])
+    rows = FilePlaydata(tmp_path).get()
+
+    assert len(rows) == 0
+    assert rows.tolist() == []
+
+
+def test_missing_manifest_is_rejected(tmp_path):
+    write_snapshot(tmp_path, ROWS)
+    (tmp_path / MANIFEST_FILE).unlink()
+
+    with pytest.raises(FileNotFoundError):
+        FilePlaydata(tmp_path)
+
+
+def test_unsupported_version_is_rejected(tmp_path):
+    write_snapshot(tmp_path, ROWS, version=SNAPSHOT_VERSION + 1)
+
+    with pytest.raises(ValueError, match="unsupported snapshot version"):
+        FilePlaydata(tmp_path)
@@ -2,27 +2,37 @@ import os
 import threading
 import time
 from pathlib import Path
-from typing import Tuple
+from typing import List, Optional, Tuple
 
-import psycopg2
 import schedule
+from playdatadb import (
+    PLAYDATA_MIGRATED_QUERY,
+    PLAYDATA_MIGRATION_HINT,
+    PLAYDATA_RETENTION_DAYS,
+    STATEMENT_TIMEOUT_MS,
+    PostgresPool,
+    compact_playdata,
+)
 from readerwriterlock import rwlock
+from snapshot import FilePlaydata
 from tictactoe.agent import QLearningAgent
 
 
 # https://schedule.readthedocs.io/en/stable/background-execution.html
 class ScheduleThread(threading.Thread):
-    @classmethod
-    def run(cls):
+    def __init__(self, scheduler: schedule.Scheduler):
+        # Daemonize the thread so that it never keeps a worker process alive on shutdown.
+        super().__init__(daemon=True)
+        self._scheduler = scheduler
+
+    def run(self):
         while True:
-            schedule.run_pending()
+            self._scheduler.run_pending()
             time.sleep(1)
 
 
-continuous_thread = ScheduleThread()
-continuous_thread.start()
-
 TRAINING_CRON_FREQUENCY_SECS = 10
+COMPACTION_CRON_FREQUENCY_HOURS = 6
 
 
 class LearningAgentWrapper:
@@ -33,30 +43,79 @@ class LearningAgentWrapper:
 
         self.agent_data_path = Path(agent_data_path_str)
         self.agent = QLearningAgent(self.agent_data_path)
+        # Incremented every time the agent is retrained, so that anything derived from
+        # the agent can be invalidated.
+        self.model_version = 0
 
         # RWLock has writer priority to avoid writer starvation from incoming requests.
         my_rwlock = rwlock.RWLockWrite()
         self.agent_write_lock = my_rwlock.gen_wlock()
         self.agent_read_lock = my_rwlock.gen_rlock()
 
-        if os.environ.get("TRAINING_DISABLE") is None or not bool(
+        # Each wrapper has its own scheduler, run by a single thread, since the
+        # schedule library is not thread-safe.
+        self._scheduler = schedule.Scheduler()
+        self._schedule_thread = None
+
+    def start(self):
+        """Open the playdata source and start the training CRON.
+
+        This must be called from the process that serves requests (i.e. after a
+        pre-fork server has forked its workers), since neither database connections
+        nor threads survive a fork.
+        """
+        if self._schedule_thread is not None:
+            return
+
+        snapshot_path = os.environ.get("PLAYDATA_SNAPSHOT_PATH")
+        if os.environ.get("TRAINING_DISABLE") is not None and bool(
             os.environ.get("TRAINING_DISABLE")
         ):
-            self._playdata = PostgresPlaydata(os.environ.get("POSTGRES_CONNECTION"))
+            print("Training disabled.")
+        elif snapshot_path is not None:
+            self._playdata = FilePlaydata(Path(snapshot_path))
+            # A snapshot never changes, so the agent only needs to be trained once.
+            self._scheduler.every(TRAINING_CRON_FREQUENCY_SECS).seconds.do(
+                self._train_once
+            )
+            print("Training from snapshot set.")
+        else:
+            self._pool = PostgresPool(
+                os.environ.get("POSTGRES_CONNECTION"),
+                statement_timeout_ms=int(
+                    os.environ.get(
+                        "POSTGRES_STATEMENT_TIMEOUT_MS", STATEMENT_TIMEOUT_MS
+                    )
+                ),
+            )
+            self._playdata = PostgresPlaydata(pool=self._pool)
             # Schedule the training CRON
-            schedule.every(TRAINING_CRON_FREQUENCY_SECS).seconds.do(self._training_cron)
+            self._scheduler.every(TRAINING_CRON_FREQUENCY_SECS).seconds.do(
+                self._training_cron
+            )
             print("Training CRON set.")
-        else:
-            print("Training disabled.")
+            # Schedule the compaction CRON
+            self._scheduler.every(COMPACTION_CRON_FREQUENCY_HOURS).hours.do(
+                self._compaction_cron
+            )
+            print("Compaction CRON set.")
+
+        self._schedule_thread = ScheduleThread(self._scheduler)
+        self._schedule_thread.start()
 
     def _training_cron(self):
         with self.agent_read_lock:
             # Save the current agent to disk.
             self.agent.save()
 
-        # TODO(richie): Implement some strategy for pruning old data. For now
-        # this is avoided by retraining the model from scratch.
-        training_data = self._playdata.get()
+        try:
+            training_data = self._playdata.get()
+        except (ConnectionError, TimeoutError) as e:
+            # Skip this training cycle rather than letting the exception stop the
+            # scheduler. The next cycle will reconnect.
+            print(f"Failed to load training data: {e}")
+            return
+
         print(f"Training with {len(training_data)} data points")
         if len(training_data) <= 0:
             return
@@ -67,22 +126,78 @@ class LearningAgentWrapper:
         with self.agent_write_lock:
             # Only hold the write lock to swap for the new agent and save to disk.
             self.agent = new_agent
+            self.model_version += 1
             self.agent.save()
 
         print("Training completed")
 
+    def _train_once(self):
+        self._training_cron()
+        return schedule.CancelJob
+
+    def _compaction_cron(self):
+        retention_days = int(
+            os.environ.get("PLAYDATA_RETENTION_DAYS", PLAYDATA_RETENTION_DAYS)
+        )
+        try:
+            compacted = compact_playdata(self._pool, retention_days=retention_days)
+        except (ConnectionError, TimeoutError, RuntimeError) as e:
+            # Compaction shares the scheduler with training, so a failed compaction
+            # must not let the exception stop the scheduler.
+            print(f"Failed to compact playdata: {e}")
+            return
+
+        if not compacted:
+            print("Compaction skipped, another worker is compacting playdata")
+            return
 
-class PostgresPlaydata:
-    def __init__(self, conn_str):
-        self._connection = psycopg2.connect(conn_str)
+        print("Compaction completed")
 
-    def get(self) -> Tuple[int, int, int, float]:
+
+class PostgresPlaydata:
+    def __init__(
+        self, conn_str: Optional[str] = None, pool: Optional[PostgresPool] = None
+    ):
+        # A pool may be passed in so that it is shared with other playdata queries.
+        self._pool = pool if pool is not None else PostgresPool(conn_str)
+        self._warned_unmigrated = False
+
+    def get(self) -> List[Tuple[int, int, int, float]]:
         # For now data is fully loaded into memory. In the future this could be improved
         # if necessary.
-        with self._connection.cursor() as cur:
-            # We order the data by descending ID to ensure that experiences are replayed
-            # in reverse order of execution. This makes reward propagation faster.
-            cur.execute(
-                "SELECT initial_state, action, resultant_state, reward FROM playdata ORDER BY id DESC"
-            )
-            return cur.fetchall()
+        # Both tables are read from a single consistent snapshot of the database, so
+        # that compaction cannot move rows between them mid-read.
+        raw_data, compacted_data = self._pool.read(
+            self._read_playdata, repeatable_read=True
+        )
+        if compacted_data is None:
+            # Databases created before playdata was partitioned have no compacted
+            # transitions, so only the raw playdata is used.
+            if not self._warned_unmigrated:
+                print(f"Compacted playdata unavailable, {PLAYDATA_MIGRATION_HINT}")
+                self._warned_unmigrated = True
+            return raw_data
+
+        return raw_data + compacted_data
+
+    @staticmethod
+    def _read_playdata(cur) -> Tuple[List[Tuple], Optional[List[Tuple]]]:
+        # We order the data by descending ID to ensure that experiences are replayed
+        # in reverse order of execution. This makes reward propagation faster.
+        cur.execute(
+            "SELECT initial_state, action, resultant_state, reward FROM playdata ORDER BY id DESC"
+        )
+        raw_data = cur.fetchall()
+
+        cur.execute(PLAYDATA_MIGRATED_QUERY)
+        (migrated,) = cur.fetchone()
+        if not migrated:
+            return raw_data, None
+
+        # Compacted transitions are older than all raw playdata, so they are replayed
+        # last, once each with their mean reward.
+        cur.execute(
+            "SELECT initial_state, action, resultant_state, reward_sum / transition_count "
+            "FROM playdata_transitions ORDER BY last_id DESC"
+        )
+        return raw_data, cur.fetchall()
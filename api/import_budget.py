@@ -0,0 +1,62 @@
+"""Measure the import time of each API's entry point against a budget.
+
+Importing an app module must stay cheap so that autoscaled containers and pre-fork
+workers come up quickly; heavy dependencies belong in `create_app()`. Run from the
+`api/` directory:
+
+    python import_budget.py
+"""
+
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+# Cumulative import time budget for each API's `app` module, in microseconds.
+IMPORT_TIME_BUDGET_US = {
+    "agent-api": 250_000,
+    "playdata-api": 250_000,
+}
+
+# Modules that must not be loaded just by importing an app module.
+LAZY_MODULES = ["jsonschema", "kafka", "numpy", "psycopg2"]
+
+# Matches the `-X importtime` line of the top level `app` module.
+IMPORT_TIME_PATTERN = re.compile(
+    r"^import time:\s+\d+ \|\s+(\d+) \| app$", re.MULTILINE
+)
+
+
+def measure(api_dir: Path) -> int:
+    # Check for eagerly loaded modules and measure in a fresh interpreter, so that
+    # nothing is already cached in `sys.modules`.
+    check = (
+        "import sys, app; "
+        f"eager = [m for m in {LAZY_MODULES!r} if m in sys.modules]; "
+        "sys.exit(f'eagerly imported: {eager}' if eager else 0)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        cwd=api_dir,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{api_dir.name}: {result.stderr.splitlines()[-1]}")
+
+    match = IMPORT_TIME_PATTERN.search(result.stderr)
+    if match is None:
+        raise RuntimeError(f"{api_dir.name}: could not measure import time")
+    return int(match.group(1))
+
+
+if __name__ == "__main__":
+    over_budget = False
+    for api_name, budget_us in IMPORT_TIME_BUDGET_US.items():
+        import_time_us = measure(Path(__file__).parent / api_name)
+        print(
+            f"{api_name}: {import_time_us / 1000:.1f}ms (budget {budget_us / 1000:.1f}ms)"
+        )
+        over_budget |= import_time_us > budget_us
+
+    sys.exit(1 if over_budget else 0)
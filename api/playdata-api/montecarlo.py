@@ -1,7 +1,7 @@
 from pathlib import Path
 
-from app import process_playdata_json
 from playdatakafka import Kafka
+from playdataprocessing import process_playdata_json
 from tictactoe.agent import Agent, QLearningAgent, RandomAgent
 from tictactoe.evaluate import StepData, evaluate_game
 from tictactoe.states import Board
@@ -1,8 +1,6 @@
 import json
 import os
 
-from kafka import KafkaProducer
-
 KAFKA_PLAYDATA_TOPIC = "playdata"
 kafka_enabled = os.environ.get("KAFKA_DISABLE") is None or not bool(
     os.environ.get("KAFKA_DISABLE")
@@ -14,6 +12,10 @@ class Kafka:
         if kafka_enabled:
             if os.environ.get("KAFKA_BOOTSTRAP_SERVER") is None:
                 raise EnvironmentError("Must define KAFKA_BOOTSTRAP_SERVER")
+            # Imported lazily so that the Kafka client is only loaded when a producer
+            # is actually created.
+            from kafka import KafkaProducer
+
             self._kafka_producer = KafkaProducer(
                 bootstrap_servers=os.environ.get("KAFKA_BOOTSTRAP_SERVER")
             )
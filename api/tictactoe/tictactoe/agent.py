@@ -2,7 +2,7 @@ import pickle
 from abc import ABC, abstractmethod
 from itertools import repeat
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Tuple
 
 import numpy as np
 from tictactoe.states import Board
@@ -42,6 +42,7 @@ class RandomAgent(Agent):
 
 
 StateActionTable = Dict[int, Dict[int, float]]
+ActionDistribution = Tuple[List[int], np.ndarray]
 
 GREEDY_SELECTION = False
 SOFTMAX_TEMPERATURE = 0.1
@@ -67,25 +68,54 @@ class QLearningAgent(Agent):
         self.load()
 
     def act(self, game_state: Board) -> Board:
+        return QLearningAgent.choose_action(game_state, self.action_distribution)
+
+    @staticmethod
+    def choose_action(
+        game_state: Board, get_action_distribution: Callable[[int], ActionDistribution]
+    ) -> Board:
+        """Sample an action for `game_state` from the distribution returned by
+        `get_action_distribution` for its normalized state code.
+
+        This allows callers to look the distribution up in a cache rather than
+        computing it with `action_distribution`.
+        """
         # Normalize the game state.
         normalization, normalization_inverse = game_state.normalization_transform
         normalized_game_state = game_state.transform(normalization)
 
-        action_values = self._action_values(normalized_game_state.code)
+        action_distribution = get_action_distribution(normalized_game_state.code)
+
+        # Apply the normalization inverse to the action so it matches the true game state.
+        return Board.from_board_code(
+            QLearningAgent.sample_action(action_distribution)
+        ).transform(normalization_inverse)
+
+    def action_distribution(self, state_code: int) -> ActionDistribution:
+        """Return the possible action codes for a normalized state, and the probability
+        of choosing each of them.
+
+        The distribution only changes when the agent is trained, so it may be cached.
+        """
+        action_values = self._action_values(state_code)
 
         if GREEDY_SELECTION:
             action_choice = max(action_values.keys(), key=action_values.get)
-        else:
-            # We use a softmax selection algorithm over the current expected rewards
-            # from each possible action.
-            action_codes = list(action_values.keys())
-            action_rewards = list(map(action_values.get, action_codes))
-            action_choice = np.random.choice(
-                action_codes, p=softmax(action_rewards, t=SOFTMAX_TEMPERATURE)
-            )
+            return [action_choice], np.ones(1)
 
-        # Apply the normalization inverse to the action so it matches the true game state.
-        return Board.from_board_code(action_choice).transform(normalization_inverse)
+        # We use a softmax selection algorithm over the current expected rewards
+        # from each possible action.
+        action_codes = list(action_values.keys())
+        action_rewards = list(map(action_values.get, action_codes))
+        return action_codes, softmax(action_rewards, t=SOFTMAX_TEMPERATURE)
+
+    @staticmethod
+    def sample_action(action_distribution: ActionDistribution) -> int:
+        action_codes, action_probabilities = action_distribution
+        if len(action_codes) == 1:
+            return action_codes[0]
+
+        return np.random.choice(action_codes, p=action_probabilities)
 
     def load(self):
         if not self._save_path.exists():
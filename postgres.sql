@@ -1,7 +1,125 @@
+-- Raw playdata is partitioned by month so that old data can be compacted and
+-- dropped a whole partition at a time. See `compact_playdata`.
 CREATE TABLE IF NOT EXISTS playdata (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
     initial_state INTEGER NOT NULL,
     action INTEGER NOT NULL,
     resultant_state INTEGER NOT NULL,
-    reward REAL NOT NULL
-)
+    reward REAL NOT NULL,
+    -- The primary key must include the partition key. It also serves the training
+    -- query, which reads playdata in descending ID order.
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Holds any rows that do not fall in a monthly partition.
+CREATE TABLE IF NOT EXISTS playdata_default PARTITION OF playdata DEFAULT;
+
+-- Serves time range queries, including compaction of the default partition.
+CREATE INDEX IF NOT EXISTS playdata_created_at_idx ON playdata (created_at);
+
+-- Transitions compacted out of old partitions, aggregated by transition. The primary
+-- key serves the upsert used by compaction.
+CREATE TABLE IF NOT EXISTS playdata_transitions (
+    initial_state INTEGER NOT NULL,
+    action INTEGER NOT NULL,
+    resultant_state INTEGER NOT NULL,
+    transition_count BIGINT NOT NULL,
+    reward_sum DOUBLE PRECISION NOT NULL,
+    -- The ID of the most recent raw row of this transition, used to replay
+    -- transitions in reverse order of execution.
+    last_id BIGINT NOT NULL,
+    PRIMARY KEY (initial_state, action, resultant_state)
+);
+
+CREATE INDEX IF NOT EXISTS playdata_transitions_last_id_idx ON playdata_transitions (last_id);
+
+-- Create the monthly partition of playdata that contains `target_month`.
+CREATE OR REPLACE FUNCTION create_playdata_partition(target_month DATE) RETURNS VOID AS $$
+DECLARE
+    range_start DATE := date_trunc('month', target_month);
+    range_end DATE := range_start + INTERVAL '1 month';
+    partition_name TEXT := 'playdata_p' || to_char(range_start, 'YYYYMM');
+    create_sql TEXT := format(
+        'CREATE TABLE %I PARTITION OF playdata FOR VALUES FROM (%L) TO (%L)',
+        partition_name, range_start, range_end
+    );
+BEGIN
+    -- Partition maintenance is serialized across all workers. If another worker
+    -- holds the lock it is already doing this work, so this call is skipped.
+    IF NOT pg_try_advisory_xact_lock(hashtext('playdata_maintenance')) THEN
+        RETURN;
+    END IF;
+
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM playdata_default
+        WHERE created_at >= range_start AND created_at < range_end
+    ) THEN
+        EXECUTE create_sql;
+        RETURN;
+    END IF;
+
+    -- A partition cannot be created while the default partition holds rows in its
+    -- range, so those rows are moved into the new partition.
+    ALTER TABLE playdata DETACH PARTITION playdata_default;
+    EXECUTE create_sql;
+    EXECUTE format(
+        'WITH moved AS ('
+        '    DELETE FROM playdata_default'
+        '    WHERE created_at >= %L AND created_at < %L RETURNING *'
+        ') INSERT INTO %I SELECT * FROM moved',
+        range_start, range_end, partition_name
+    );
+    ALTER TABLE playdata ATTACH PARTITION playdata_default DEFAULT;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Roll all playdata created before `cutoff` into playdata_transitions and drop the
+-- raw rows. Monthly partitions are dropped whole, which avoids deleting and vacuuming
+-- individual rows.
+CREATE OR REPLACE FUNCTION compact_playdata(cutoff TIMESTAMPTZ) RETURNS VOID AS $$
+DECLARE
+    partition_name TEXT;
+    aggregate_sql TEXT :=
+        'INSERT INTO playdata_transitions ('
+        '    initial_state, action, resultant_state, transition_count, reward_sum, last_id'
+        ') SELECT initial_state, action, resultant_state, COUNT(*), SUM(reward), MAX(id)'
+        ' FROM %I GROUP BY initial_state, action, resultant_state'
+        ' ON CONFLICT (initial_state, action, resultant_state) DO UPDATE SET'
+        '    transition_count = playdata_transitions.transition_count + EXCLUDED.transition_count,'
+        '    reward_sum = playdata_transitions.reward_sum + EXCLUDED.reward_sum,'
+        '    last_id = GREATEST(playdata_transitions.last_id, EXCLUDED.last_id)';
+BEGIN
+    -- Partition maintenance is serialized across all workers. If another worker
+    -- holds the lock it is already doing this work, so this call is skipped.
+    IF NOT pg_try_advisory_xact_lock(hashtext('playdata_maintenance')) THEN
+        RETURN;
+    END IF;
+
+    FOR partition_name IN
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'playdata'::regclass
+            AND c.relname ~ '^playdata_p[0-9]{6}$'
+            AND to_date(substring(c.relname FROM 11), 'YYYYMM') + INTERVAL '1 month' <= cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format(aggregate_sql, partition_name);
+        EXECUTE format('DROP TABLE %I', partition_name);
+    END LOOP;
+
+    -- Rows in the default partition cannot be dropped as a whole, so they are
+    -- deleted individually.
+    EXECUTE
+        'WITH expired AS ('
+        '    DELETE FROM playdata_default WHERE created_at < $1 RETURNING *'
+        ') ' || format(aggregate_sql, 'expired')
+    USING cutoff;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_playdata_partition(CURRENT_DATE);
+SELECT create_playdata_partition((CURRENT_DATE + INTERVAL '1 month')::DATE);